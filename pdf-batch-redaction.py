@@ -10,21 +10,40 @@ file with "_redacted" in the file name alongside the original.
 
 This script requires an installation of PyMuPDF in your Python environment: https://github.com/pymupdf/PyMuPDF#installation
 
-Script usage: python path/to/script path/to/dir/for/redaction [replace]
+Using the optional flag "--verbose" prints each file and the outcome of its redaction to the
+terminal as it is processed.
+
+Script usage: python path/to/script path/to/dir/for/redaction [replace] [--verbose]
 """
 import fitz #This is the import for PyMuPDF
 import os
 import sys
 import csv
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
 date = datetime.now().strftime("%Y%m%d")
 header = ['File', 'Date_redacted', 'Notes']
 
-dir = sys.argv[1]
+# Change these substrings to search the PDF text and find the specific redaction area.
+# End markers are tried in order and the first one found after the start marker is used.
+START_REDACT = "Login and Password information if needed\n"
+START_LEN = len(START_REDACT)
+END_REDACTS = ("\nStory Link 1", "\nVideo Upload 1", "\nPublication, ")
+# Matches any end marker in a single pass over the text
+END_PATTERN = re.compile("|".join(map(re.escape, END_REDACTS)))
+# Redaction text that means there is nothing to redact
+EMPTY_RESULTS = ('n/a', 'na')
+CHECK_FILE = "CHECK FILE: Potential redaction found but not completed"
+
+VERBOSE = "--verbose" in sys.argv
+args = [arg for arg in sys.argv[1:] if arg != "--verbose"]
+
+dir = args[0]
 try:
-    if sys.argv[2]:
-        optional_arg = sys.argv[2]
+    if args[1]:
+        optional_arg = args[1]
 except IndexError:
     optional_arg = 'null'
 
@@ -44,20 +63,24 @@ def find_files_in_dir(dir):
         Individual os.DirEntry objects for the specified files as they are generated
     """
 
-    for entry in os.scandir(dir):
-        if entry.is_dir():
-            yield from find_files_in_dir(entry.path)
-        else:
-            filename = str(entry.name)
-            try:
-                if filename.startswith(("Application-", "Judge-")):
-                    if filename.endswith(".pdf"):
-                        if filename.endswith("_redacted.pdf"):
-                            continue
-                        else:
-                            yield entry
-            except TypeError:
-                continue
+    # Walk the tree with a stack instead of recursion, so each file is yielded directly rather
+    # than through one generator per directory level, and only one directory is open at a time
+    dirs = [dir]
+    while dirs:
+        with os.scandir(dirs.pop()) as d:
+            for entry in d:
+                if entry.is_dir():
+                    dirs.append(entry.path)
+                    continue
+
+                name = entry.name
+                if not name.startswith(("Application-", "Judge-")):
+                    continue
+                if not name.endswith(".pdf") or name.endswith("_redacted.pdf"):
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                yield entry
 
 
 def find_redaction_log(dir):
@@ -80,13 +103,16 @@ def find_redaction_log(dir):
                 redact_log = entry.path
                 return str(redact_log)
 
-def log_file(file, error=None):
+def log_file(file, today, error=None):
     """Adds a filepath, timestamp, and optional error field to the redaction log.
     
     Parameters
     -----------
     file : str
         The path of the file the script is trying to redact
+
+    today : str
+        The date of the batch, formatted as YYYY-MM-DD
     
     error: str
         Text to appear in the "Notes" field of the redaction log
@@ -95,11 +121,7 @@ def log_file(file, error=None):
     -----------
     None
     """
-    data = []
-    data.append(file)
-    data.append(datetime.now().strftime("%Y-%m-%d"))
-    data.append({error})
-    writer.writerow(data)
+    writer.writerow((file, today, error))
 
 def redaction(file):
     """Opens a file, locates the text to redact by identifying starting and ending strings, 
@@ -112,6 +134,9 @@ def redaction(file):
     are split. Future solution could be regex that doesn't rely on starting/ending strings being
     on the same page, or a function that combines all text without breaks before searching it.]]
 
+    Runs in a worker process, so it reports back to batch_redact() instead of writing to
+    the redaction log itself.
+
     Parameters
     -----------
     file : path attribute of os.DirEntry object
@@ -119,71 +144,82 @@ def redaction(file):
     
     Returns
     -----------
-    file: path attribute of os.DirEntry object
-        The path attribute of a file object that has been successfully redacted
+    tuple
+        The file path, its status ("Redacted" or "Unredacted"), and an error for the
+        "Notes" field of the redaction log (None if there is nothing to review)
         
     """
 
-    doc = fitz.open(os.path.join(dir, file))
+    doc = fitz.open(file)
 
     file_stat = 'Unredacted'
+    error = None
 
     for page in doc:
-        text = page.get_text()
+        # Skip only truly empty pages: no content streams (listed without decompressing them),
+        # no annotations and no form fields, whose text get_text() also returns
+        if not page.get_contents() and not page.first_annot and not page.first_widget:
+            continue
 
-        # Change these substrings to search the PDF text and find the specific redaction area
-        start_redact = "Login and Password information if needed\n"
-        end_redact1 = "\nStory Link 1"
-        end_redact2 = "\nVideo Upload 1"
-        end_redact3 = "\nPublication, "
+        # Build the page's text layout once and share it between extraction and search
+        tp = page.get_textpage()
+        text = tp.extractText()
 
         result = None
 
-        if end_redact1 in text:
-            error = "CHECK FILE: Potential redaction found but not completed"
-            try:
-                result = text[text.index(start_redact)+len(start_redact):text.index(end_redact1)]
-            except ValueError:
-                #print(f'\t> {error}')
-                log_file(file, error)
-                result = None
+        i = text.find(START_REDACT)
+        if i < 0:
+            if END_PATTERN.search(text):
+                error = CHECK_FILE
+            continue
+
+        i += START_LEN
+        for end in END_REDACTS:
+            j = text.find(end, i)
+            if j >= 0:
+                result = text[i:j]
+                break
+        else:
+            error = CHECK_FILE
 
-        if end_redact2 in text:
-            try:
-                result = text[text.index(start_redact)+len(start_redact):text.index(end_redact2)]
-            except ValueError:
-                #print(f'\t> {error}')
-                log_file(file, error)
-                result = None
+        if result != None:
+            if result.lower() not in EMPTY_RESULTS:
+                rects = page.search_for(result, textpage=tp)
 
-        if end_redact3 in text:
-            try:
-                result = text[text.index(start_redact)+len(start_redact):text.index(end_redact3)]
-            except ValueError:
-                #print(f'\t> {error}')
-                log_file(file, error)
-                result = None
+                # Free the TextPage before the page is rewritten; it is stale afterwards
+                tp = None
+                if not rects:
+                    error = CHECK_FILE
+                    continue
+
+                # Each rect needs its own redaction annotation for apply_redactions() to remove
+                # the text under it; cross_out=False skips drawing an appearance that is discarded
+                for rect in rects:
+                    page.add_redact_annot(rect, fill=(0,0,0), cross_out=False)
 
-        if result != None:
-            if result.lower() not in ['n/a', 'na']:
-                for rect in page.search_for(result):
-                    page.add_redact_annot(rect, fill=(0,0,0))
-              
                 page.apply_redactions()
                 file_stat = 'Redacted'
 
     if file_stat == 'Redacted':
-        new = file.split(".pdf")[0]
+        new = os.path.splitext(file)[0]
         newname = f"{new}_redacted.pdf"
-        doc.save(newname)
-        #print(f'\t> REDACTED')
-        return file
+        # garbage=3 drops unreferenced objects, which include the pages' pre-redaction content.
+        # Never save incrementally: that appends changes and keeps the original text in the file.
+        buf = doc.tobytes(garbage=3, deflate=True, clean=True)
+        with open(newname, "wb") as out:
+            out.write(buf)
+
+    # Close the document now so a worker doesn't hold finished files in memory
+    doc.close()
+
+    return file, file_stat, error
 
 
 def batch_redact(dir):
     """Iterates through a directory, calling the redaction() function for each
-    appropriate file, printing the result to the terminal, and logging both 
-    successful redactions and attempts with errors in the CSV redaction log.
+    appropriate file in a pool of worker processes, printing the result to the terminal
+    if "--verbose" is used, and logging both successful redactions and attempts with
+    errors in the CSV redaction log as the workers finish.
 
     Parameters
     -----------
@@ -199,20 +235,35 @@ def batch_redact(dir):
 
     files = []
     count = 0
-    for entry in find_files_in_dir(dir):
-        count += 1
-        filepath = entry.path
-        #print(f'\n{count}) {filepath}')
+    today = datetime.now().strftime("%Y-%m-%d")
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, 4)) as executor:
+        futures = {executor.submit(redaction, entry.path): entry.path for entry in find_files_in_dir(dir)}
+
+        for future in as_completed(futures):
+            count += 1
+            filepath = futures[future]
+            if VERBOSE:
+                print(f'\n{count}) {filepath}')
+
+            try:
+                f, file_stat, error = future.result()
+            except Exception:
+                error = 'ERROR - needs review'
+                if VERBOSE:
+                    print(f'\t> {error}')
+                log_file(filepath, today, error)
+                continue
 
-        try:
-            f = redaction(filepath)
-        except Exception:
-            error = 'ERROR - needs review'
-            log_file(filepath, error)
+            if error != None:
+                if VERBOSE:
+                    print(f'\t> {error}')
+                log_file(f, today, error)
 
-        if f != None:
-            log_file(f)
-            files.append(f)
+            if file_stat == 'Redacted':
+                if VERBOSE:
+                    print('\t> REDACTED')
+                log_file(f, today)
+                files.append(f)
 
     return files
 
@@ -226,12 +277,12 @@ if __name__ == "__main__":
           
     else:
         redact_log = f'{dir}\\redactionlog_{date}.csv'
-        with open(redact_log, "w", encoding="utf-8", newline='') as log:
-            writer = csv.writer(log, delimiter=',')
-            writer.writerow(header)  
 
-    with open(redact_log, "a", encoding="utf-8", newline='') as log:
+    # A 1 MiB buffer collects log rows into a few large writes; it is flushed when the file closes
+    with open(redact_log, "a", encoding="utf-8", newline='', buffering=1 << 20) as log:
         writer = csv.writer(log, delimiter=',')
+        if os.fstat(log.fileno()).st_size == 0:
+            writer.writerow(header)
 
         if optional_arg.lower() == "replace":
             confirm = input(f'\nYou have chosen to create new redacted files and delete the originals. This action cannot be undone.\n\nType Y to continue and N to quit: ')